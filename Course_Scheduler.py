@@ -10,12 +10,27 @@ import os
 
 # === 1. Setup & Configuration ===
 
+# Print extra diagnostics (e.g. the assignment preview table)
+DEBUG = False
+
+# Default input/output files (used when run as a script; override via environment)
+GROUPWISE_PATH = os.environ.get("GROUPWISE_PATH", "groupwise_course_tags_fall2025.xlsx")
+STUDENTS_PATH = os.environ.get("STUDENTS_PATH", "number-of-students-fall-2024-extracted.csv")
+OUTPUT_PATH = os.environ.get("OUTPUT_PATH", "weekly_timetable_fall2025.xlsx")
+
 # Define Rooms and Capacities
 room_df = pd.DataFrame({
     "Room": ["Amphitheater", "101", "102", "151", "152", "153", "154", "155", "10", "12"],
     "Capacity": [201, 95, 49, 90, 48, 48, 16, 16, 18, 15]
 })
 
+# (Room, Capacity) tuples sorted by Capacity ASCENDING (Best Fit Strategy), built once.
+# Stable sort: rooms with equal capacity keep their declaration order.
+rooms_by_capacity = list(
+    room_df.sort_values(by="Capacity", ascending=True, kind="stable")[["Room", "Capacity"]].itertuples(index=False, name=None)
+)
+room_capacities_sorted = np.array([cap for _, cap in rooms_by_capacity])
+
 # Define Time Slots (Mon-Fri, AM/PM)
 time_slots = [
     "Mon_AM", "Mon_PM",
@@ -25,6 +40,25 @@ time_slots = [
     "Fri_AM", "Fri_PM",
 ]
 
+# Timetable layout (rows = periods, columns = days)
+days = ["Mon", "Tue", "Wed", "Thu", "Fri"]
+slots = ["AM", "PM"]
+
+# Halves as 2-bit masks: two half configurations overlap iff (mask_a & mask_b) != 0
+H1, H2, LONG = 0b01, 0b10, 0b11
+half_names = {H1: "H1", H2: "H2", LONG: "Long"}
+
+# Half configurations per course Type
+# Long courses take both halves; Short courses prefer H1, but allow H2
+half_configs_by_type = {
+    "L": (LONG,),
+    "S": (H1, H2),
+}
+
+# Excel formatting: shared cell style and the sheet columns (TimeSlot + Mon..Fri)
+CENTER_WRAP = Alignment(wrap_text=True, horizontal='center', vertical='center')
+SHEET_COLUMNS = ['A', 'B', 'C', 'D', 'E', 'F']
+
 # === 2. Data Loading & Cleaning Functions ===
 
 def load_groupwise(path: str) -> pd.DataFrame:
@@ -73,340 +107,370 @@ def load_students(path: str) -> pd.DataFrame:
 
 # === 3. Pre-processing ===
 
-print("--- Loading Data ---")
-try:
-    groupwise_df = load_groupwise("groupwise_course_tags_fall2025.xlsx")
-    students_df = load_students("number-of-students-fall-2024-extracted.csv")
-except Exception as e:
-    print(f"Error loading files: {e}")
-    # Initialize empty defaults to prevent crash
-    course_info = pd.DataFrame()
-    exit(1)
-
 # Aggregating Course Info
-def get_primary_value(series):
-    return series.mode()[0] if not series.mode().empty else series.iloc[0]
-
-course_info = groupwise_df.groupby("Course").agg(
-    Track=("Track", get_primary_value),
-    Type=("Type", get_primary_value),
-    IsMandatory=("GroupTag", lambda s: (s == "mandatory").any())
-).reset_index()
-
-# Merge Student Counts
-course_info = course_info.merge(students_df, on="Course", how="left")
-course_info["Students_2024"] = course_info["Students_2024"].fillna(0).astype(int)
-
-# === GREEDY STRATEGY: SORTING ===
-# Priority: Mandatory -> High Enrollment -> Long Duration
-course_info = course_info.sort_values(
-    by=["IsMandatory", "Students_2024", "Type"],
-    ascending=[False, False, True] 
-).reset_index(drop=True)
-
-print(f"Loaded {len(course_info)} unique courses to schedule.")
-
-# === 4. Scheduler State Initialization ===
-
-assignments = []
-unassigned = []
-
-# Slot Load (for soft balancing)
-slot_load = {slot: 0 for slot in time_slots}
-
-# Track Constraints: Track -> Set of (Slot, Half)
-track_mandatory_usage = defaultdict(set) 
-
-# Room Occupancy: (Slot, Room) -> Set of Halves {'H1', 'H2'}
-room_occupancy = defaultdict(set)
-
-def is_room_free(slot, room, required_halves):
-    """Check if the room is free for the required halves in the given slot."""
-    occupied_halves = room_occupancy.get((slot, room), set())
-    if not required_halves.isdisjoint(occupied_halves):
-        return False
-    return True
-
-def book_room(slot, room, halves):
-    """Mark room as occupied."""
-    current = room_occupancy[(slot, room)]
-    room_occupancy[(slot, room)] = current.union(halves)
-
-def check_track_conflict(track, slot, halves):
-    """Check if this track already has a mandatory class in this slot/half."""
-    used_halves = track_mandatory_usage.get((track, slot), set())
-    if not halves.isdisjoint(used_halves):
-        return True 
-    return False
-
-def record_track_usage(track, slot, halves):
-    current = track_mandatory_usage[(track, slot)]
-    track_mandatory_usage[(track, slot)] = current.union(halves)
-
-
-# === 5. Main Greedy Loop ===
-
-print("\n--- Starting Greedy Schedule ---")
-
-for _, row in course_info.iterrows():
-    course = row["Course"]
-    track = row["Track"]
-    is_mandatory = row["IsMandatory"]
-    students = row["Students_2024"]
-    ctype = row["Type"] 
-
-    # Prepare required halves
-    if ctype == 'L':
-        possible_half_configs = [{'H1', 'H2'}]
-    else:
-        # Prefer H1, but allow H2
-        possible_half_configs = [{'H1'}, {'H2'}]
+def get_primary_values(df: pd.DataFrame, col: str) -> pd.Series:
+    """Most frequent `col` value per Course; ties go to the smallest value, like Series.mode()[0]."""
+    counts = df.groupby(["Course", col]).size().reset_index(name="Count")
+    counts = counts.sort_values(["Course", "Count", col], ascending=[True, False, True])
+    return counts.drop_duplicates(subset="Course").set_index("Course")[col]
+
+def build_course_info(groupwise_df: pd.DataFrame, students_df: pd.DataFrame) -> pd.DataFrame:
+    """One row per course (Track, Type, IsMandatory, Students_2024), in greedy priority order."""
+    # Built-in reducers only: no Python callback per group
+    is_mandatory_tag = groupwise_df["GroupTag"].eq("mandatory")
+    course_info = pd.DataFrame({
+        "Track": get_primary_values(groupwise_df, "Track"),
+        "Type": get_primary_values(groupwise_df, "Type"),
+        "IsMandatory": is_mandatory_tag.groupby(groupwise_df["Course"]).any(),
+    }).rename_axis("Course").reset_index()
+
+    # Merge Student Counts
+    course_info = course_info.merge(students_df, on="Course", how="left")
+    course_info["Students_2024"] = course_info["Students_2024"].fillna(0).astype(int)
+
+    # === GREEDY STRATEGY: SORTING ===
+    # Priority: Mandatory -> High Enrollment -> Long Duration
+    # One stable np.lexsort on the raw columns (last key is the primary one);
+    # Type is always "L" or "S" after loading, so "L" first is Type ascending
+    order = np.lexsort((
+        course_info["Type"].to_numpy() != "L",
+        -course_info["Students_2024"].to_numpy(),
+        ~course_info["IsMandatory"].to_numpy(),
+    ))
+    course_info = course_info.iloc[order].reset_index(drop=True)
+    return course_info
+
+# === 4. Greedy Search ===
+
+def find_best_choice(track, is_mandatory, students, possible_half_configs,
+                     slot_load, room_occupancy, track_usage, track_mandatory_usage):
+    """Score every (slot, half, room) candidate for one course.
+
+    Only reads the scheduler state. Returns (score, slot, halves, room, capacity)
+    for the best candidate, or None if no slot/room combination is valid.
+    """
+    # Halves already used by this track, per slot (one lookup per course)
+    track_slot_usage = track_usage[track]
+    track_slot_mandatory = track_mandatory_usage[track]
+
+    # Rooms big enough for this course: a suffix of the capacity-sorted list
+    first_fit = int(np.searchsorted(room_capacities_sorted, students, side="left"))
+    valid_rooms = rooms_by_capacity[first_fit:]
 
     best_choice = None
     best_score = float('inf')
 
     # Iterate all Time Slots
     for slot in time_slots:
-        
-        # Iterate all Half Configurations
+        # Per-slot state, read once and shared by every half configuration
+        slot_room_usage = room_occupancy[slot]
+        slot_mandatory_halves = track_slot_mandatory.get(slot, 0) if is_mandatory else 0
+        slot_track_halves = 0 if is_mandatory else track_slot_usage.get(slot, 0)
+        load_penalty = slot_load[slot]
+
+        # Iterate all Half Configurations (a single one for Long courses)
         for required_halves in possible_half_configs:
-            
+
             # --- Hard Constraint 1: Mandatory Track Conflict ---
-            if is_mandatory:
-                if check_track_conflict(track, slot, required_halves):
-                    continue 
+            # (this track already has a mandatory class in this slot/half)
+            if slot_mandatory_halves & required_halves:
+                continue
 
             # --- Hard Constraint 2 & Soft Constraint (Best Fit) ---
-            # Filter rooms by capacity
-            valid_rooms = room_df[room_df["Capacity"] >= students].copy()
-            # Sort valid rooms by Capacity ASCENDING (Best Fit Strategy)
-            valid_rooms = valid_rooms.sort_values(by="Capacity", ascending=True)
-            
             selected_room = None
             selected_capacity = 0
-            
-            # Find first available room
-            for _, r_data in valid_rooms.iterrows():
-                r_name = r_data["Room"]
-                r_cap = r_data["Capacity"]
-                
-                if is_room_free(slot, r_name, required_halves):
+
+            # Find first available room with enough capacity
+            # (room is free if none of the required halves are booked)
+            for r_name, r_cap in valid_rooms:
+                if not slot_room_usage.get(r_name, 0) & required_halves:
                     selected_room = r_name
                     selected_capacity = r_cap
-                    break 
-            
+                    break
+
             if not selected_room:
-                continue 
-            
+                continue
+
             # --- Soft Constraints Calculation (Scoring) ---
-            
-            # 1. Load Balance (SPREAD): 
+
+            # 1. Load Balance (SPREAD):
             # Use simple load count. Less load = Better score.
-            load_penalty = slot_load[slot]
-            
+            # (load_penalty is read once per slot above)
+
             # 2. Track Overlap (Regular)
             overlap_penalty = 0
-            if not is_mandatory:
-                for a in assignments:
-                    if a["TimeSlot"] == slot and a["Track"] == track:
-                        if not required_halves.isdisjoint(a["Halves"]):
-                            overlap_penalty = 1
-                            break
-            
+            if slot_track_halves & required_halves:
+                overlap_penalty = 1
+
             # 3. Room Slack (Waste)
-            slack_penalty = (selected_capacity - students) / 10.0 
-            
+            slack_penalty = (selected_capacity - students) / 10.0
+
             # Total Score (Weighted)
             # High weight on overlap to prevent it
             # Moderate weight on load to force spreading across week
             total_score = (load_penalty * 10) + (overlap_penalty * 100) + slack_penalty
-            
+
             if total_score < best_score:
                 best_score = total_score
-                half_str = "Long" if ctype == 'L' else list(required_halves)[0]
-                
-                best_choice = {
-                    "Course": course,
-                    "TimeSlot": slot,
-                    "Room": selected_room,
-                    "Half": half_str,
-                    "Halves": required_halves,
-                    "Track": track,
-                    "IsMandatory": is_mandatory,
-                    "Students": students,
-                    "Capacity": selected_capacity,
-                    "Score": best_score
-                }
-
-    # Assign the best found slot
-    if best_choice:
-        assignments.append(best_choice)
-        slot_load[best_choice["TimeSlot"]] += 1
-        book_room(best_choice["TimeSlot"], best_choice["Room"], best_choice["Halves"])
-        if is_mandatory:
-            record_track_usage(track, best_choice["TimeSlot"], best_choice["Halves"])
+                best_choice = (best_score, slot, required_halves, selected_room, selected_capacity)
+
+    return best_choice
+
+
+# === 5. Main Greedy Loop ===
+
+def schedule_courses(course_info: pd.DataFrame):
+    """Greedily assign each course to a (slot, half, room).
+
+    Returns (assignments_df, unassigned). All scheduler state is local to one call.
+    """
+    unassigned = []
+
+    # Assignment columns, preallocated for at most one row per course and filled in order
+    n_courses = len(course_info)
+    assignment_columns = {
+        "Course": np.empty(n_courses, dtype=object),
+        "TimeSlot": np.empty(n_courses, dtype=object),
+        "Room": np.empty(n_courses, dtype=object),
+        "Half": np.empty(n_courses, dtype=object),
+        "Halves": np.empty(n_courses, dtype=np.int8),
+        "Track": np.empty(n_courses, dtype=object),
+        "IsMandatory": np.empty(n_courses, dtype=bool),
+        "Students": np.empty(n_courses, dtype=np.int32),
+        "Capacity": np.empty(n_courses, dtype=np.int32),
+        "Score": np.empty(n_courses, dtype=np.float64),
+    }
+    n_assigned = 0
+
+    # Slot Load (for soft balancing)
+    slot_load = {slot: 0 for slot in time_slots}
+
+    # Track Constraints (mandatory courses): Track -> {Slot -> Halves bitmask}
+    track_mandatory_usage = defaultdict(lambda: defaultdict(int))
+
+    # Track Usage by all courses (for overlap scoring): Track -> {Slot -> Halves bitmask}
+    track_usage = defaultdict(lambda: defaultdict(int))
+
+    # Room Occupancy: Slot -> {Room -> Halves bitmask (H1 | H2)}
+    room_occupancy = defaultdict(lambda: defaultdict(int))
+
+    print("\n--- Starting Greedy Schedule ---")
+
+    course_rows = course_info[["Course", "Track", "Type", "IsMandatory", "Students_2024"]].itertuples(index=False, name=None)
+
+    for course, track, ctype, is_mandatory, students in course_rows:
+        # Plain Python int: keeps NumPy scalar dispatch out of the scoring arithmetic
+        students = int(students)
+
+        # Prepare required halves
+        possible_half_configs = half_configs_by_type[ctype]
+
+        best_choice = find_best_choice(
+            track, is_mandatory, students, possible_half_configs,
+            slot_load, room_occupancy, track_usage, track_mandatory_usage,
+        )
+
+        # Assign the best found slot
+        if best_choice:
+            best_score, best_slot, best_halves, best_room, best_capacity = best_choice
+
+            assignment_columns["Course"][n_assigned] = course
+            assignment_columns["TimeSlot"][n_assigned] = best_slot
+            assignment_columns["Room"][n_assigned] = best_room
+            assignment_columns["Half"][n_assigned] = half_names[best_halves]
+            assignment_columns["Halves"][n_assigned] = best_halves
+            assignment_columns["Track"][n_assigned] = track
+            assignment_columns["IsMandatory"][n_assigned] = is_mandatory
+            assignment_columns["Students"][n_assigned] = students
+            assignment_columns["Capacity"][n_assigned] = best_capacity
+            assignment_columns["Score"][n_assigned] = best_score
+            n_assigned += 1
+            slot_load[best_slot] += 1
+            # Mark room and track halves as occupied
+            room_occupancy[best_slot][best_room] |= best_halves
+            track_usage[track][best_slot] |= best_halves
+            if is_mandatory:
+                track_mandatory_usage[track][best_slot] |= best_halves
+        else:
+            unassigned.append({
+                "Course": course,
+                "Reason": "No valid room/slot found"
+            })
+
+    # Build DataFrame
+    if n_assigned == 0:
+        assignments_df = pd.DataFrame(columns=["Course", "TimeSlot", "Room", "Half", "Track", "IsMandatory", "Students", "Capacity", "SoftConflict"])
     else:
-        unassigned.append({
-            "Course": course,
-            "Reason": "No valid room/slot found"
-        })
+        # One-shot construction from the filled prefix of each typed column
+        assignments_df = pd.DataFrame({col: values[:n_assigned] for col, values in assignment_columns.items()})
+
+    return assignments_df, unassigned
 
 # === 6. Output & Diagnostics ===
 
-print("\n--- Scheduling Complete ---")
-if unassigned:
-    print(f"⚠️ Warning: {len(unassigned)} courses could not be scheduled:")
-else:
-    print("✅ All courses successfully scheduled!")
+# 定义一个格式化函数，专门用来把表格变“漂亮”
+def format_worksheet(worksheet, row_lines):
+    """Wrap/center every cell and size the rows; row_lines[i] is the tallest cell's
+    line count in data row i (counted while the timetable was built)."""
+    # 1. 设置列宽 (设为 30，足够宽以容纳课程信息)
+    for col in SHEET_COLUMNS:
+        worksheet.column_dimensions[col].width = 35
+
+    # 2. 设置对齐方式：自动换行，水平居中，垂直居中 (所有格子共用一个 Alignment)
+    # 空格子不需要样式，跳过
+    for row in worksheet.iter_rows():
+        for cell in row:
+            if cell.value:
+                cell.alignment = CENTER_WRAP
+
+    # 3. 设置行高
+    # 这里的逻辑是：每一行文字给 25 的高度，基础再加 10 的边距
+    # 这样即使只有一行字，也不会贴着边框
+    # 表头稍微高一点
+    worksheet.row_dimensions[1].height = 40
+    for row_idx, max_lines in enumerate(row_lines, start=2):
+        # 内容行高度 = 行数 * 25 + 10 (Padding)
+        worksheet.row_dimensions[row_idx].height = (max_lines * 25) + 10
+
+def run_scheduler(groupwise_path: str, students_path: str, output_excel_path: str) -> dict:
+    """Schedule all courses and write the formatted timetable workbook.
+
+    Returns a dict with the cleaned "assignments" DataFrame, the master "timetable"
+    ({period: {day: text}}), the "unassigned" list and summary "stats".
+    """
+    print("--- Loading Data ---")
+    try:
+        groupwise_df = load_groupwise(groupwise_path)
+        students_df = load_students(students_path)
+    except Exception as e:
+        print(f"Error loading files: {e}")
+        raise
 
-# Initialize variables
-days = ["Mon", "Tue", "Wed", "Thu", "Fri"]
-slots = ["AM", "PM"]
-timetable = {s: {d: "" for d in days} for s in slots}
-
-# Build DataFrame
-if not assignments:
-    assignments_df = pd.DataFrame(columns=["Course", "TimeSlot", "Room", "Half", "Track", "IsMandatory", "Students", "Capacity", "SoftConflict"])
-else:
-    assignments_df = pd.DataFrame(assignments)
-
-if not assignments_df.empty:
-    # Recalculate Soft Conflicts
-    def check_soft_conflict(row):
-        if row["IsMandatory"]: return False
-        current_halves = row["Halves"]
-        others = assignments_df[
-            (assignments_df["TimeSlot"] == row["TimeSlot"]) & 
-            (assignments_df["Track"] == row["Track"]) & 
-            (assignments_df["Course"] != row["Course"])
-        ]
-        for _, o in others.iterrows():
-            if not current_halves.isdisjoint(o["Halves"]):
-                return True
-        return False
-
-    assignments_df["SoftConflict"] = assignments_df.apply(check_soft_conflict, axis=1)
-    
-    # Data Cleaning for JSON/Web
-    safe_cols = ["Course", "TimeSlot", "Room", "Half", "Track", "IsMandatory", "Students", "Capacity", "SoftConflict"]
-    assignments_df = assignments_df[safe_cols].copy()
-    
-    assignments_df["Students"] = assignments_df["Students"].astype(int)
-    assignments_df["Capacity"] = assignments_df["Capacity"].astype(int)
-    assignments_df["SoftConflict"] = assignments_df["SoftConflict"].astype(bool)
-    assignments_df["IsMandatory"] = assignments_df["IsMandatory"].astype(bool)
-    
-    assignments_df = assignments_df.sort_values(by=["TimeSlot", "Room"])
-    
-    print("\nTop 10 Assignments:")
-    print(assignments_df.head(10).to_string(index=False))
-    
-    # Fill Master Timetable Dictionary
-    for _, row in assignments_df.iterrows():
-        day, period = row["TimeSlot"].split("_")
-        entry = f"{row['Course']} ({row['Room']}, {row['Half']})"
-        if row["SoftConflict"]:
-            entry += " *"
-        current = timetable[period][day]
-        timetable[period][day] = (current + "\n" + entry) if current else entry
-            
-    # === NEW: Save Excel with Formatting (Spacing & Alignment) ===
-    output_filename = "weekly_timetable_fall2025.xlsx"
-    
-    # 定义一个格式化函数，专门用来把表格变“漂亮”
-    def format_worksheet(worksheet):
-        # 1. 设置列宽 (设为 30，足够宽以容纳课程信息)
-        for col in ['A', 'B', 'C', 'D', 'E', 'F']:
-            worksheet.column_dimensions[col].width = 35
-
-        # 2. 遍历每一行，设置自动换行、居中和动态行高
-        for row in worksheet.iter_rows():
-            max_lines = 1
-            for cell in row:
-                # 设置对齐方式：自动换行，水平居中，垂直居中
-                cell.alignment = Alignment(wrap_text=True, horizontal='center', vertical='center')
-                
-                # 计算这个格子里有多少行文字（根据换行符 \n）
-                if cell.value and isinstance(cell.value, str):
-                    lines = str(cell.value).count('\n') + 1
-                    if lines > max_lines:
-                        max_lines = lines
-            
-            # 3. 设置行高
-            # 这里的逻辑是：每一行文字给 25 的高度，基础再加 10 的边距
-            # 这样即使只有一行字，也不会贴着边框
-            current_row_idx = row[0].row
-            if current_row_idx == 1:
-                # 表头稍微高一点
-                worksheet.row_dimensions[current_row_idx].height = 40
-            else:
-                # 内容行高度 = 行数 * 25 + 10 (Padding)
-                worksheet.row_dimensions[current_row_idx].height = (max_lines * 25) + 10
+    # One GroupTag per (Course, Track) pair (first row wins), used to build the track sheets
+    course_track_tags = groupwise_df.drop_duplicates(subset=["Course", "Track"])[["Course", "Track", "GroupTag"]]
 
-    try:
-        # 使用 openpyxl 引擎写入
-        with pd.ExcelWriter(output_filename, engine='openpyxl') as writer:
-            
-            # --- Sheet 1: Master Schedule ---
+    course_info = build_course_info(groupwise_df, students_df)
+    print(f"Loaded {len(course_info)} unique courses to schedule.")
+
+    assignments_df, unassigned = schedule_courses(course_info)
+
+    print("\n--- Scheduling Complete ---")
+    if unassigned:
+        print(f"⚠️ Warning: {len(unassigned)} courses could not be scheduled:")
+    else:
+        print("✅ All courses successfully scheduled!")
+
+    # Initialize variables
+    timetable = {s: {d: "" for d in days} for s in slots}
+    # Line count of the tallest cell per period, used for the Excel row heights
+    timetable_lines = {s: 1 for s in slots}
+
+    if not assignments_df.empty:
+        # Recalculate Soft Conflicts
+        # Count, per (TimeSlot, Track), how many courses use each half. A course overlaps
+        # another one iff some half it uses is used by at least two courses in its group.
+        uses_h1 = (assignments_df["Halves"] & H1) != 0
+        uses_h2 = (assignments_df["Halves"] & H2) != 0
+        group_keys = [assignments_df["TimeSlot"], assignments_df["Track"]]
+        h1_count = uses_h1.groupby(group_keys).transform("sum")
+        h2_count = uses_h2.groupby(group_keys).transform("sum")
+        shares_half = (uses_h1 & (h1_count >= 2)) | (uses_h2 & (h2_count >= 2))
+
+        assignments_df["SoftConflict"] = ~assignments_df["IsMandatory"].astype(bool) & shares_half
+
+        # Data Cleaning for JSON/Web
+        safe_cols = ["Course", "TimeSlot", "Room", "Half", "Track", "IsMandatory", "Students", "Capacity", "SoftConflict"]
+        # One astype pass over the selected columns (returns a new frame, so no extra .copy())
+        assignments_df = assignments_df[safe_cols].astype({
+            "Students": int,
+            "Capacity": int,
+            "SoftConflict": bool,
+            "IsMandatory": bool,
+        })
+
+        assignments_df = assignments_df.sort_values(by=["TimeSlot", "Room"])
+
+        if DEBUG:
+            print("\nTop 10 Assignments:")
+            print(assignments_df.head(10).to_string(index=False))
+
+        # Split "Mon_AM" into Day / Period once, vectorized; kept out of assignments_df,
+        # which is the table exported to the web
+        day_period = assignments_df["TimeSlot"].str.split("_", n=1, expand=True)
+        day_period.columns = ["Day", "Period"]
+        timetable_rows = pd.concat([assignments_df, day_period], axis=1)
+
+        # Fill Master Timetable Dictionary
+        for row in timetable_rows.itertuples(index=False):
+            day, period = row.Day, row.Period
+            entry = f"{row.Course} ({row.Room}, {row.Half})"
+            if row.SoftConflict:
+                entry += " *"
+            current = timetable[period][day]
+            timetable[period][day] = (current + "\n" + entry) if current else entry
+            timetable_lines[period] = max(timetable_lines[period], timetable[period][day].count("\n") + 1)
+
+        # === NEW: Save Excel with Formatting (Spacing & Alignment) ===
+        try:
+            # 使用 openpyxl 引擎写入
+            with pd.ExcelWriter(output_excel_path, engine='openpyxl') as writer:
+
+                # --- Sheet 1: Master Schedule ---
+                timetable_df = pd.DataFrame.from_dict(timetable, orient="index")[days]
+                timetable_df.index.name = "TimeSlot"
+                timetable_df.to_excel(writer, sheet_name="Master_Schedule")
+
+                # 对 Master Schedule 应用格式
+                format_worksheet(writer.sheets["Master_Schedule"], [timetable_lines[s] for s in slots])
+
+                # --- Sheet 2~N: Individual Track Schedules ---
+                # Join every assignment to each track its course belongs to once, build all
+                # cell entries vectorized and join them per (Track, Period, Day) in one groupby
+                track_rows = timetable_rows[["Course", "Day", "Period", "Room"]].merge(course_track_tags, on="Course")
+                tag_labels = np.where(track_rows["GroupTag"].str.contains("mandatory", regex=False), " [M]", " [R]")
+                # 这里加了 \n 让教室名换行显示，更整洁；课程之间加两个换行
+                track_rows["Entry"] = track_rows["Course"].astype(str) + tag_labels + "\n(" + track_rows["Room"].astype(str) + ")"
+                track_cells = track_rows.groupby(["Track", "Period", "Day"], sort=False)["Entry"].agg("\n\n".join)
+                track_lines = (track_cells.str.count("\n") + 1).groupby(level=["Track", "Period"]).max()
+
+                # Tracks in sorted order (tracks without assignments get no sheet)
+                for track, cells in track_cells.groupby(level="Track", sort=True):
+                    sheet_name = "".join(c for c in str(track) if c.isalnum() or c in (' ', '_', '-'))[:30]
+
+                    track_df = (
+                        cells.droplevel("Track").unstack("Day", fill_value="")
+                        .reindex(index=slots, columns=days, fill_value="")
+                        .rename_axis(index="TimeSlot", columns=None)
+                    )
+                    track_df.to_excel(writer, sheet_name=sheet_name)
+
+                    # 对 Track Sheet 应用格式
+                    format_worksheet(writer.sheets[sheet_name], [int(track_lines.get((track, s), 1)) for s in slots])
+
+            print(f"\n📁 Timetable saved with FORMATTING to: {output_excel_path}")
+
+        except Exception as e:
+            print(f"Error saving Excel: {e}")
+            # Fallback
             timetable_df = pd.DataFrame.from_dict(timetable, orient="index")[days]
-            timetable_df.index.name = "TimeSlot"
-            timetable_df.to_excel(writer, sheet_name="Master_Schedule")
-            
-            # 对 Master Schedule 应用格式
-            format_worksheet(writer.sheets["Master_Schedule"])
-            
-            # --- Sheet 2~N: Individual Track Schedules ---
-            all_tracks = sorted(groupwise_df['Track'].unique())
-            
-            for track in all_tracks:
-                sheet_name = "".join(c for c in str(track) if c.isalnum() or c in (' ', '_', '-'))[:30]
-                
-                track_courses = groupwise_df[groupwise_df['Track'] == track]['Course'].unique()
-                track_assignments = assignments_df[assignments_df['Course'].isin(track_courses)]
-                
-                if track_assignments.empty:
-                    continue
-                    
-                track_timetable = {s: {d: "" for d in days} for s in slots}
-                
-                for _, row in track_assignments.iterrows():
-                    day, period = row["TimeSlot"].split("_")
-                    course_name = row['Course']
-                    
-                    tags = groupwise_df[
-                        (groupwise_df['Course'] == course_name) & 
-                        (groupwise_df['Track'] == track)
-                    ]['GroupTag']
-                    
-                    tag_label = ""
-                    if not tags.empty:
-                        tag_type = tags.iloc[0].lower()
-                        if 'mandatory' in tag_type:
-                            tag_label = " [M]"
-                        else:
-                            tag_label = " [R]"
-                    
-                    entry = f"{course_name}{tag_label}\n({row['Room']})" # 这里加了 \n 让教室名换行显示，更整洁
-                    
-                    current = track_timetable[period][day]
-                    track_timetable[period][day] = (current + "\n\n" + entry) if current else entry # 课程之间加两个换行
-                
-                track_df = pd.DataFrame.from_dict(track_timetable, orient="index")[days]
-                track_df.index.name = "TimeSlot"
-                track_df.to_excel(writer, sheet_name=sheet_name)
-                
-                # 对 Track Sheet 应用格式
-                format_worksheet(writer.sheets[sheet_name])
-                
-        print(f"\n📁 Timetable saved with FORMATTING to: {output_filename}")
-        
-    except Exception as e:
-        print(f"Error saving Excel: {e}")
-        # Fallback
-        timetable_df = pd.DataFrame.from_dict(timetable, orient="index")[days]
-        timetable_df.to_excel("weekly_timetable_fall2025.xlsx")
+            timetable_df.to_excel(output_excel_path)
 
-else:
-    print("No assignments made.")
-    timetable_df = pd.DataFrame.from_dict(timetable, orient="index")[days]
-    timetable_df.to_excel("weekly_timetable_fall2025.xlsx")
+    else:
+        print("No assignments made.")
+        timetable_df = pd.DataFrame.from_dict(timetable, orient="index")[days]
+        timetable_df.to_excel(output_excel_path)
+
+    return {
+        "assignments": assignments_df,
+        "timetable": timetable,
+        "unassigned": unassigned,
+        "stats": {
+            "totalCourses": len(assignments_df),
+            "unassigned": len(unassigned),
+            "softConflicts": int(assignments_df["SoftConflict"].sum())
+        }
+    }
+
+
+if __name__ == "__main__":
+    run_scheduler(GROUPWISE_PATH, STUDENTS_PATH, OUTPUT_PATH)
@@ -5,16 +5,44 @@ This is a copy of app.py adapted for Vercel
 from flask import Flask, request, jsonify, send_file
 import os
 import pandas as pd
-import subprocess
-import json
 import tempfile
 import shutil
 from datetime import datetime
 import sys
+import re
+import base64
+import time
+import uuid
+
+# Course_Scheduler.py lives in the project root (or next to this file on Vercel)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Course_Scheduler import run_scheduler
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Workbooks up to INLINE_EXCEL_MAX_BYTES are returned inline as base64, which works
+# whichever Vercel instance serves the request. Larger ones (which would push the
+# JSON past Vercel's response size limit) are kept in this instance's ephemeral /tmp
+# for a short while and streamed by /api/download/<token>; that only succeeds if the
+# download reaches the same warm instance.
+INLINE_EXCEL_MAX_BYTES = 2 * 1024 * 1024
+DOWNLOAD_FOLDER = os.path.join(tempfile.gettempdir(), 'course_scheduler_downloads')
+DOWNLOAD_TTL = 15 * 60  # seconds a workbook stays downloadable
+os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
+
+def prune_downloads():
+    """Delete workbooks older than DOWNLOAD_TTL."""
+    now = time.time()
+    for name in os.listdir(DOWNLOAD_FOLDER):
+        path = os.path.join(DOWNLOAD_FOLDER, name)
+        try:
+            if now - os.path.getmtime(path) > DOWNLOAD_TTL:
+                os.remove(path)
+        except OSError:
+            pass
+
 # Error handlers
 @app.errorhandler(500)
 def internal_error(error):
@@ -53,103 +81,35 @@ def schedule():
             groupwise_file.save(groupwise_path)
             students_file.save(students_path)
             
-            # Copy scheduler script
-            scheduler_script = os.path.join(temp_dir, 'Course_Scheduler.py')
-            # Get the parent directory (project root)
-            project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            script_source = os.path.join(project_root, 'Course_Scheduler.py')
-            
-            # Check if file exists, if not try current directory
-            if not os.path.exists(script_source):
-                # Try in api directory (for Vercel)
-                script_source = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Course_Scheduler.py')
-            
-            if not os.path.exists(script_source):
-                return jsonify({'error': 'Course_Scheduler.py not found'}), 500
-            
-            shutil.copy(script_source, scheduler_script)
-            
-            # Modify script
-            with open(scheduler_script, 'r') as f:
-                script_content = f.read()
-            
-            script_content = script_content.replace(
-                'pd.read_excel("groupwise_course_tags_fall2025.xlsx")',
-                f'pd.read_excel(r"{groupwise_path}")'
-            )
-            script_content = script_content.replace(
-                'pd.read_csv("number-of-students-fall-2024-extracted.csv")',
-                f'pd.read_csv(r"{students_path}")'
-            )
-            
-            output_excel = os.path.join(temp_dir, 'weekly_timetable_fall2025.xlsx')
-            script_content = script_content.replace(
-                'timetable_df.to_excel("weekly_timetable_fall2025.xlsx")',
-                f'timetable_df.to_excel(r"{output_excel}")'
-            )
-            
-            # Add JSON export
-            json_export_code = f'''
-# === Export JSON for web interface ===
-import json
-import os
-
-output_data = {{
-    "timetable": {{}},
-    "assignments": assignments_df.to_dict('records'),
-    "stats": {{
-        "totalCourses": len(assignments_df),
-        "unassigned": len(unassigned),
-        "softConflicts": int(assignments_df["SoftConflict"].sum())
-    }}
-}}
-
-for slot in slots:
-    output_data["timetable"][slot] = {{}}
-    for day in days:
-        output_data["timetable"][slot][day] = timetable[slot].get(day, "")
-
-json_output = os.path.join(r"{temp_dir}", "output.json")
-with open(json_output, 'w') as f:
-    json.dump(output_data, f, indent=2)
-'''
-            script_content = script_content + '\n' + json_export_code
-            
-            with open(scheduler_script, 'w') as f:
-                f.write(script_content)
+            # Write the workbook straight to the download folder under a random token
+            prune_downloads()
+            token = uuid.uuid4().hex
+            output_excel = os.path.join(DOWNLOAD_FOLDER, f'{token}.xlsx')
             
-            # Run script
+            # Run scheduler in-process
             try:
-                result = subprocess.run(
-                    [sys.executable, scheduler_script],
-                    cwd=temp_dir,
-                    capture_output=True,
-                    text=True,
-                    timeout=50  # Vercel pro tier has 60s limit
-                )
-            except subprocess.TimeoutExpired:
-                return jsonify({'error': 'Processing timeout. The schedule is too complex.'}), 500
-            
-            if result.returncode != 0:
-                error_msg = result.stderr or result.stdout or 'Unknown error'
-                error_msg = error_msg.replace('\n', ' ').strip()[:500]
+                result = run_scheduler(groupwise_path, students_path, output_excel)
+            except Exception as e:
+                # Don't leave a partially written workbook behind
+                if os.path.exists(output_excel):
+                    os.remove(output_excel)
+                error_msg = str(e).replace('\n', ' ').strip()[:500] or 'Unknown error'
                 return jsonify({'error': f'Scheduler error: {error_msg}'}), 500
             
-            # Read JSON output
-            json_path = os.path.join(temp_dir, 'output.json')
-            if not os.path.exists(json_path):
-                return jsonify({'error': 'Output file not generated'}), 500
-            
-            with open(json_path, 'r') as f:
-                output_data = json.load(f)
-            
-            # In Vercel, we can't save files persistently
-            # Return Excel as base64 encoded string
-            import base64
-            with open(output_excel, 'rb') as f:
-                excel_data = base64.b64encode(f.read()).decode('utf-8')
-            
-            output_data['excelFile'] = excel_data
+            output_data = {
+                "timetable": result["timetable"],
+                "assignments": result["assignments"].to_dict('records'),
+                "stats": result["stats"]
+            }
+            
+            if os.path.getsize(output_excel) <= INLINE_EXCEL_MAX_BYTES:
+                # Return Excel as base64 encoded string
+                with open(output_excel, 'rb') as f:
+                    output_data['excelFile'] = base64.b64encode(f.read()).decode('utf-8')
+                os.remove(output_excel)
+            else:
+                # The client downloads the workbook from /api/download/<token>
+                output_data['excelFile'] = token
             output_data['excelFileName'] = f'weekly_timetable_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
             
             return jsonify(output_data)
@@ -163,13 +123,18 @@ with open(json_output, 'w') as f:
         print(f"Error in schedule endpoint: {error_trace}")
         return jsonify({'error': f'An error occurred: {str(e)}'}), 500
 
-# Note: Vercel doesn't support persistent file storage
-# So we'll handle downloads differently
-@app.route('/api/download', methods=['POST'])
-def download():
-    # In Vercel, files are returned as base64 in the response
-    # This endpoint is not needed, but kept for compatibility
-    return jsonify({'error': 'Files are included in the schedule response as base64'}), 501
+@app.route('/api/download/<token>')
+def download(token):
+    try:
+        # Tokens are uuid4 hex strings; anything else never names a file
+        if not re.fullmatch(r'[0-9a-f]{32}', token):
+            return jsonify({'error': 'File not found'}), 404
+        file_path = os.path.join(DOWNLOAD_FOLDER, f'{token}.xlsx')
+        if not os.path.exists(file_path):
+            return jsonify({'error': 'File not found or expired. Please generate the schedule again.'}), 404
+        return send_file(file_path, as_attachment=True, download_name='weekly_timetable.xlsx')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 # Root route for health check
 @app.route('/', methods=['GET'])
@@ -1,12 +1,14 @@
 from flask import Flask, render_template, request, jsonify, send_file
 import os
 import pandas as pd
-import subprocess
-import json
 import tempfile
 import shutil
+import uuid
+import threading
+import multiprocessing
 from datetime import datetime
-import sys
+
+from Course_Scheduler import run_scheduler
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
@@ -17,6 +19,65 @@ app.config['OUTPUT_FOLDER'] = 'outputs'
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 
+# Each scheduler run gets its own child process, forked from this one (Linux), so it
+# starts with Course_Scheduler and pandas/numpy/openpyxl already imported. A timeout
+# kills only that child; at most SCHEDULER_WORKERS run at once.
+SCHEDULER_WORKERS = 4
+SCHEDULER_TIMEOUT = 300  # 5 minute timeout
+
+scheduler_slots = threading.BoundedSemaphore(SCHEDULER_WORKERS)
+
+class SchedulerTimeout(Exception):
+    pass
+
+def _scheduler_process(conn, groupwise_path, students_path, output_excel):
+    """Child process: run the scheduler and send back ('ok', result) or ('error', message)."""
+    try:
+        conn.send(('ok', run_scheduler(groupwise_path, students_path, output_excel)))
+    except Exception as e:
+        conn.send(('error', str(e)))
+    finally:
+        conn.close()
+
+def run_scheduler_in_process(groupwise_path, students_path, output_excel, timeout):
+    """Run run_scheduler in a child process and return its result.
+
+    Raises SchedulerTimeout if no slot frees up or the run exceeds `timeout` seconds
+    (the child is killed), and RuntimeError if the scheduler fails or the child dies.
+    The child has always exited when this returns or raises.
+    """
+    if not scheduler_slots.acquire(timeout=timeout):
+        raise SchedulerTimeout()
+    try:
+        recv_conn, send_conn = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(
+            target=_scheduler_process,
+            args=(send_conn, groupwise_path, students_path, output_excel),
+            daemon=True,
+        )
+        process.start()
+        send_conn.close()
+        try:
+            # poll() is also true once the child has exited without sending (recv -> EOFError)
+            if not recv_conn.poll(timeout):
+                process.kill()
+                raise SchedulerTimeout()
+            try:
+                status, payload = recv_conn.recv()
+            except EOFError:
+                status, payload = 'died', None
+        finally:
+            process.join()
+            recv_conn.close()
+    finally:
+        scheduler_slots.release()
+
+    if status == 'died':
+        raise RuntimeError(f'Scheduler process exited unexpectedly (exit code {process.exitcode})')
+    if status == 'error':
+        raise RuntimeError(payload)
+    return payload
+
 # Error handlers to ensure JSON responses
 @app.errorhandler(500)
 def internal_error(error):
@@ -63,97 +124,32 @@ def schedule():
             groupwise_file.save(groupwise_path)
             students_file.save(students_path)
             
-            # Copy the scheduler script to temp directory
-            scheduler_script = os.path.join(temp_dir, 'Course_Scheduler.py')
-            shutil.copy('Course_Scheduler.py', scheduler_script)
-            
-            # Modify the script to work in temp directory
-            with open(scheduler_script, 'r') as f:
-                script_content = f.read()
-            
-            # Update paths in the script
-            script_content = script_content.replace(
-                'pd.read_excel("groupwise_course_tags_fall2025.xlsx")',
-                f'pd.read_excel(r"{groupwise_path}")'
-            )
-            script_content = script_content.replace(
-                'pd.read_csv("number-of-students-fall-2024-extracted.csv")',
-                f'pd.read_csv(r"{students_path}")'
-            )
-            
-            # Change output path
-            output_excel = os.path.join(temp_dir, 'weekly_timetable_fall2025.xlsx')
-            script_content = script_content.replace(
-                'timetable_df.to_excel("weekly_timetable_fall2025.xlsx")',
-                f'timetable_df.to_excel(r"{output_excel}")'
-            )
-            
-            # Add code to export JSON data at the end of the script
-            json_export_code = f'''
-# === Export JSON for web interface ===
-import json
-import os
-
-output_data = {{
-    "timetable": {{}},
-    "assignments": assignments_df.to_dict('records'),
-    "stats": {{
-        "totalCourses": len(assignments_df),
-        "unassigned": len(unassigned),
-        "softConflicts": int(assignments_df["SoftConflict"].sum())
-    }}
-}}
-
-# Convert timetable to nested dict
-for slot in slots:
-    output_data["timetable"][slot] = {{}}
-    for day in days:
-        output_data["timetable"][slot][day] = timetable[slot].get(day, "")
-
-# Save JSON
-json_output = os.path.join(r"{temp_dir}", "output.json")
-with open(json_output, 'w') as f:
-    json.dump(output_data, f, indent=2)
-'''
-            
-            # Insert before the final print statements
-            script_content = script_content + '\n' + json_export_code
-            
-            # Write modified script
-            with open(scheduler_script, 'w') as f:
-                f.write(script_content)
+            # Write the Excel file straight into the outputs folder with a unique name
+            # (several workers may write at once, so the timestamp alone is not enough)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            excel_filename = f'weekly_timetable_{timestamp}_{uuid.uuid4().hex}.xlsx'
+            output_excel = os.path.join(app.config['OUTPUT_FOLDER'], excel_filename)
             
-            # Run the scheduler script
+            # Run the scheduler in its own child process
+            # (the child has exited by the time either except branch runs)
             try:
-                result = subprocess.run(
-                    [sys.executable, scheduler_script],
-                    cwd=temp_dir,
-                    capture_output=True,
-                    text=True,
-                    timeout=300  # 5 minute timeout
-                )
-            except subprocess.TimeoutExpired:
+                result = run_scheduler_in_process(groupwise_path, students_path, output_excel, SCHEDULER_TIMEOUT)
+            except SchedulerTimeout:
+                if os.path.exists(output_excel):
+                    os.remove(output_excel)
                 return jsonify({'error': 'Processing timeout. The schedule is too complex. Please try with smaller datasets.'}), 500
-            
-            if result.returncode != 0:
-                error_msg = result.stderr or result.stdout or 'Unknown error occurred'
-                # Clean up error message
-                error_msg = error_msg.replace('\n', ' ').strip()[:500]
+            except Exception as e:
+                # Don't leave a partially written workbook behind
+                if os.path.exists(output_excel):
+                    os.remove(output_excel)
+                error_msg = str(e).replace('\n', ' ').strip()[:500] or 'Unknown error occurred'
                 return jsonify({'error': f'Scheduler error: {error_msg}'}), 500
             
-            # Read the JSON output
-            json_path = os.path.join(temp_dir, 'output.json')
-            if not os.path.exists(json_path):
-                return jsonify({'error': 'Output file not generated'}), 500
-            
-            with open(json_path, 'r') as f:
-                output_data = json.load(f)
-            
-            # Copy Excel file to outputs folder with unique name
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            excel_filename = f'weekly_timetable_{timestamp}.xlsx'
-            output_excel_path = os.path.join(app.config['OUTPUT_FOLDER'], excel_filename)
-            shutil.copy(output_excel, output_excel_path)
+            output_data = {
+                "timetable": result["timetable"],
+                "assignments": result["assignments"].to_dict('records'),
+                "stats": result["stats"]
+            }
             
             output_data['excelFile'] = excel_filename
             